@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+"""In-container measurements for the desktop benchmark suite.
+
+Copied into a running container by run_benchmarks.py and executed with the
+image's own python3 (pulled in by supervisor). Standard library only, no
+network access required. Every subcommand prints a single JSON document.
+
+    desktop_probe.py startup [--timeout S]
+    desktop_probe.py idle [--seconds S]
+    desktop_probe.py rfb [--port P] [--display D] [--seconds S] [--mode full|incremental]
+                         [--encoding zrle|tight|raw] [--redraw-fps N]
+    desktop_probe.py swing [--runs N] [--timeout S]
+"""
+
+import argparse
+import json
+import os
+import socket
+import struct
+import subprocess
+import sys
+import threading
+import time
+
+STATE_DIR = os.environ.get("DESKTOP_STATE_DIR", "/tmp/desktop")
+HEALTH_COMMAND = "desktop-health"
+WARMUP_CLASSES = "/opt/java-cds/classes"
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+def read_timings(path):
+    """Parse the key=value timings file written by vnc-startup.sh."""
+    timings = {}
+    try:
+        with open(path) as handle:
+            for line in handle:
+                key, sep, value = line.strip().partition("=")
+                if sep and value.lstrip("-").isdigit():
+                    timings[key] = int(value)
+    except FileNotFoundError:
+        pass
+    return timings
+
+
+def window_manager_running(display):
+    """True once a window manager has claimed the root window."""
+    result = subprocess.run(
+        ["xprop", "-display", display, "-root", "_NET_SUPPORTING_WM_CHECK"],
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+    )
+    return result.returncode == 0 and "window id" in result.stdout
+
+
+def read_session(index):
+    """Timings and connection details recorded for one session."""
+    session_dir = os.path.join(STATE_DIR, "session-%d" % index)
+    timings = read_timings(os.path.join(session_dir, "timings"))
+    env = {}
+    try:
+        with open(os.path.join(session_dir, "session.env")) as handle:
+            for line in handle:
+                key, sep, value = line.strip().partition("=")
+                if sep:
+                    env[key] = value
+    except FileNotFoundError:
+        pass
+    return timings, env
+
+
+def cmd_startup(args):
+    """Wait for every session to come up and report stage timings."""
+    sessions = int(os.environ.get("SESSION_COUNT", "1"))
+    deadline = time.monotonic() + args.timeout
+    pending = set(range(1, sessions + 1))
+    per_session = {}
+
+    while pending and time.monotonic() < deadline:
+        for index in sorted(pending):
+            timings, env = read_session(index)
+            # Xvfb, x11vnc and the session record their stages independently
+            stages = ("xvfb_ready", "vnc_ready", "session_exec")
+            if all(stage in timings for stage in stages) and window_manager_running(env["DISPLAY"]):
+                per_session[index] = {
+                    "xvfb_ready_ms": timings["xvfb_ready"],
+                    "vnc_ready_ms": timings["vnc_ready"],
+                    "session_ready_ms": now_ms() - timings["container_start"],
+                }
+                pending.discard(index)
+        time.sleep(0.05)
+
+    if pending:
+        return {"error": "sessions %s not ready after %ss" % (sorted(pending), args.timeout)}
+
+    # Stage timings of the pod are those of its slowest session
+    result = {"sessions": sessions, "per_session": [per_session[i] for i in sorted(per_session)]}
+    for key in ("xvfb_ready_ms", "vnc_ready_ms", "session_ready_ms"):
+        result[key] = max(values[key] for values in per_session.values())
+    return result
+
+
+def program_usage():
+    """CPU seconds and RSS bytes per supervised program, from desktop-health."""
+    run = subprocess.run([HEALTH_COMMAND, "usage", "--json"], stdout=subprocess.PIPE,
+                         stderr=subprocess.PIPE, universal_newlines=True, timeout=30)
+    if run.returncode != 0:
+        raise RuntimeError(run.stderr.strip() or "%s exited with %d" % (HEALTH_COMMAND, run.returncode))
+    return json.loads(run.stdout)
+
+
+def cmd_idle(args):
+    """Sample RSS and CPU of each supervised process tree while idle."""
+    try:
+        before = program_usage()
+        start = time.monotonic()
+        time.sleep(args.seconds)
+        elapsed = time.monotonic() - start
+        after = program_usage()
+    except (OSError, RuntimeError, subprocess.TimeoutExpired) as error:
+        return {"error": "%s usage failed: %s" % (HEALTH_COMMAND, error)}
+
+    result = {}
+    for name, usage in after.items():
+        # A program restarted during the window starts again from zero
+        cpu = usage["cpu_seconds"] - before.get(name, {}).get("cpu_seconds", 0)
+        result[name] = {
+            "rss_bytes": usage["rss_bytes"],
+            "cpu_percent": round(100.0 * max(cpu, 0) / elapsed, 2),
+        }
+    return result
+
+
+def recv_exact(sock, size):
+    buf = bytearray(size)
+    view = memoryview(buf)
+    got = 0
+    while got < size:
+        n = sock.recv_into(view[got:], size - got)
+        if not n:
+            raise ConnectionError("server closed the connection")
+        got += n
+    return bytes(buf)
+
+
+class RedrawWorkload(threading.Thread):
+    """Repaint a window on the display at a fixed rate, so x11vnc has damage to send.
+
+    A minimal X11 client on the display's unix socket: an override-redirect
+    window filled with colour bars that shift by one bar every frame, which
+    resembles an application redrawing part of the screen.
+    """
+
+    def __init__(self, display, fps, width=640, height=480):
+        super().__init__(daemon=True)
+        self.fps = fps
+        self.stopped = threading.Event()
+        number = display.lstrip(":").split(".")[0]
+        self.sock = socket.socket(socket.AF_UNIX)
+        self.sock.connect("/tmp/.X11-unix/X%s" % number)
+        self.sock.sendall(struct.pack("<cxHHHHxx", b"l", 11, 0, 0, 0))
+        status, length = struct.unpack("<BxxxxxH", recv_exact(self.sock, 8))
+        reply = recv_exact(self.sock, length * 4)
+        if status != 1:
+            raise ConnectionError("X server refused the connection")
+        id_base = struct.unpack_from("<I", reply, 4)[0]
+        vendor_length, formats = struct.unpack_from("<H2xxB", reply, 16)
+        screen = 32 + (vendor_length + 3) // 4 * 4 + formats * 8
+        root, _, _, black = struct.unpack_from("<IIII", reply, screen)
+        self.screen_width, self.screen_height = struct.unpack_from("<HH", reply, screen + 20)
+        self.width, self.height = min(width, self.screen_width), min(height, self.screen_height)
+        self.window, self.gc = id_base + 1, id_base + 2
+
+        # CreateWindow (black background, override-redirect), MapWindow, CreateGC
+        self.sock.sendall(
+            struct.pack("<BBHIIhhHHHHII", 1, 0, 10, self.window, root, 0, 0, self.width, self.height,
+                        0, 1, 0, 0x202) + struct.pack("<II", black, 1)
+            + struct.pack("<BxHI", 8, 2, self.window)
+            + struct.pack("<BxHIIII", 55, 5, self.gc, self.window, 0x4, 0))
+
+    def run(self):
+        colours = [0xd62728, 0x2ca02c, 0x1f77b4, 0xff7f0e, 0x9467bd, 0x8c564b, 0xe377c2, 0x7f7f7f]
+        bar = max(self.width // len(colours), 1)
+        frame = 0
+        while not self.stopped.wait(1.0 / self.fps):
+            requests = []
+            for index, colour in enumerate(colours):
+                # ChangeGC foreground, then PolyFillRectangle for one bar
+                requests.append(struct.pack("<BxHIII", 56, 4, self.gc, 0x4,
+                                            colours[(index + frame) % len(colours)]))
+                requests.append(struct.pack("<BxHIIhhHH", 70, 5, self.window, self.gc,
+                                            index * bar, 0, bar, self.height))
+            self.sock.sendall(b"".join(requests))
+            frame += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        self.sock.close()
+
+
+# Encodings advertised by the client, in order of preference (RFC 6143 and
+# the Tight extension). Hextile is not offered, so it is never chosen.
+ENCODINGS = {"zrle": 16, "tight": 7, "raw": 0}
+ENCODING_COPYRECT = 1
+
+
+def rfb_connect(port, encoding):
+    """Complete an unauthenticated RFB 3.8 handshake and return the session."""
+    sock = socket.create_connection(("127.0.0.1", port), timeout=10)
+    version = recv_exact(sock, 12)
+    if not version.startswith(b"RFB "):
+        raise ConnectionError("not an RFB server: %r" % version)
+    sock.sendall(b"RFB 003.008\n")
+    count = recv_exact(sock, 1)[0]
+    if count == 0:
+        length = struct.unpack(">I", recv_exact(sock, 4))[0]
+        raise ConnectionError(recv_exact(sock, length).decode(errors="replace"))
+    if 1 not in recv_exact(sock, count):
+        raise ConnectionError("server requires authentication")
+    sock.sendall(b"\x01")
+    if struct.unpack(">I", recv_exact(sock, 4))[0] != 0:
+        raise ConnectionError("security handshake failed")
+
+    sock.sendall(b"\x01")  # shared session
+    width, height = struct.unpack(">HH", recv_exact(sock, 4))
+    pixel_format = recv_exact(sock, 16)
+    name_length = struct.unpack(">I", recv_exact(sock, 4))[0]
+    recv_exact(sock, name_length)
+
+    # The chosen encoding first, then CopyRect and Raw as a real viewer does
+    encodings = [ENCODINGS[encoding], ENCODING_COPYRECT] + ([0] if encoding != "raw" else [])
+    sock.sendall(struct.pack(">BxH%di" % len(encodings), 2, len(encodings), *encodings))
+    return sock, width, height, pixel_format
+
+
+def compact_length(sock):
+    """Read a Tight compact length (1-3 bytes, 7 bits each)."""
+    value = shift = size = 0
+    while True:
+        byte = recv_exact(sock, 1)[0]
+        size += 1
+        value |= (byte & 0x7f) << shift
+        shift += 7
+        if not byte & 0x80 or size == 3:
+            return value, size
+
+
+def read_tight(sock, w, h, pixel_size):
+    """Consume one Tight-encoded rectangle and return its size in bytes."""
+    control = recv_exact(sock, 1)[0]
+    kind = control >> 4
+    if kind == 8:  # fill
+        recv_exact(sock, pixel_size)
+        return 1 + pixel_size
+    if kind == 9:  # JPEG
+        length, size = compact_length(sock)
+        recv_exact(sock, length)
+        return 1 + size + length
+    if kind > 9:
+        raise ConnectionError("invalid Tight compression control 0x%02x" % control)
+
+    total = 1
+    row_size = w * pixel_size
+    if control & 0x40:  # explicit filter
+        flt = recv_exact(sock, 1)[0]
+        total += 1
+        if flt == 1:  # palette
+            colours = recv_exact(sock, 1)[0] + 1
+            recv_exact(sock, colours * pixel_size)
+            total += 1 + colours * pixel_size
+            row_size = (w + 7) // 8 if colours == 2 else w
+    data_size = row_size * h
+    if data_size < 12:  # too small to compress, sent as is
+        recv_exact(sock, data_size)
+        return total + data_size
+    length, size = compact_length(sock)
+    recv_exact(sock, length)
+    return total + size + length
+
+
+def read_server_message(sock, pixel_format):
+    """Consume one server message, return (is_update, payload bytes)."""
+    bpp, depth, _, true_colour, red, green, blue = struct.unpack(">BBBBHHH", pixel_format[:10])
+    bytes_per_pixel = bpp // 8
+    # Tight sends 24-bit pixels as 3 bytes
+    tight_pixel = 3 if (bpp, depth, true_colour, red, green, blue) == (32, 24, 1, 255, 255, 255) \
+        else bytes_per_pixel
+
+    kind = recv_exact(sock, 1)[0]
+    if kind == 0:
+        rects = struct.unpack(">xH", recv_exact(sock, 3))[0]
+        total = 4
+        for _ in range(rects):
+            _, _, w, h, encoding = struct.unpack(">HHHHi", recv_exact(sock, 12))
+            total += 12
+            if encoding == 0:
+                recv_exact(sock, w * h * bytes_per_pixel)
+                total += w * h * bytes_per_pixel
+            elif encoding == ENCODING_COPYRECT:
+                recv_exact(sock, 4)
+                total += 4
+            elif encoding == 16:
+                length = struct.unpack(">I", recv_exact(sock, 4))[0]
+                recv_exact(sock, length)
+                total += 4 + length
+            elif encoding == 7:
+                total += read_tight(sock, w, h, tight_pixel)
+            else:
+                raise ConnectionError("unexpected encoding %d" % encoding)
+        return True, total
+    if kind == 1:
+        colours = struct.unpack(">xHH", recv_exact(sock, 5))[1]
+        recv_exact(sock, colours * 6)
+        return False, 6 + colours * 6
+    if kind == 2:
+        return False, 1
+    if kind == 3:
+        length = struct.unpack(">xxxI", recv_exact(sock, 7))[0]
+        recv_exact(sock, length)
+        return False, 8 + length
+    raise ConnectionError("unknown server message %d" % kind)
+
+
+def cmd_rfb(args):
+    """Measure framebuffer update throughput while a scripted redraw runs."""
+    workload = RedrawWorkload(args.display, args.redraw_fps)
+    sock, width, height, pixel_format = rfb_connect(args.port, args.encoding)
+    # With -ncache x11vnc reports a framebuffer several screens tall; only
+    # request the visible screen so the cache area is not counted
+    width, height = min(width, workload.screen_width), min(height, workload.screen_height)
+    incremental = 1 if args.mode == "incremental" else 0
+    request = struct.pack(">BBHHHH", 3, incremental, 0, 0, width, height)
+
+    frames = received = 0
+    workload.start()
+    sock.sendall(struct.pack(">BBHHHH", 3, 0, 0, 0, width, height))
+    start = time.monotonic()
+    deadline = start + args.seconds
+    try:
+        while time.monotonic() < deadline:
+            sock.settimeout(max(deadline - time.monotonic(), 0.01))
+            is_update, size = read_server_message(sock, pixel_format)
+            received += size
+            if is_update:
+                frames += 1
+                sock.sendall(request)
+    except socket.timeout:
+        pass
+    elapsed = time.monotonic() - start
+    workload.stop()
+    sock.close()
+
+    return {
+        "mode": args.mode,
+        "encoding": args.encoding,
+        "geometry": "%dx%dx%d" % (width, height, pixel_format[0]),
+        "redraw_fps": args.redraw_fps,
+        "frames": frames,
+        "bytes": received,
+        "frames_per_second": round(frames / elapsed, 2),
+        "bytes_per_second": int(received / elapsed),
+    }
+
+
+def cmd_swing(args):
+    """Cold Swing startup to first painted frame, with and without CDS."""
+    # Images built without the jdk.compiler module have no compiled warmup
+    if not os.path.isfile(os.path.join(WARMUP_CLASSES, "DesktopWarmup.class")):
+        return {"error": "DesktopWarmup is not compiled in %s" % WARMUP_CLASSES}
+    tool_options = os.environ.get("JAVA_TOOL_OPTIONS", "")
+    desktop_options = os.environ.get("JAVA_DESKTOP_OPTIONS", "")
+    variants = {
+        # No class sharing at all
+        "xshare_off_ms": "-Xshare:off " + desktop_options,
+        # The JDK's own default CDS archive (java.base only)
+        "jdk_cds_ms": desktop_options,
+        # The image defaults, including the desktop archive
+        "desktop_cds_ms": tool_options,
+    }
+    result = {}
+    for name, options in variants.items():
+        env = dict(os.environ, JAVA_TOOL_OPTIONS=options.strip())
+        samples = []
+        for _ in range(args.runs):
+            start = time.monotonic()
+            try:
+                run = subprocess.run(["java", "-cp", WARMUP_CLASSES, "DesktopWarmup"], env=env,
+                                     stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                     timeout=args.timeout)
+            except subprocess.TimeoutExpired:
+                return {"error": "DesktopWarmup did not exit after %ss (%s)" % (args.timeout, name)}
+            if run.returncode != 0:
+                return {"error": "DesktopWarmup exited with %d (%s)" % (run.returncode, name)}
+            samples.append((time.monotonic() - start) * 1000)
+        result[name] = int(sorted(samples)[len(samples) // 2])
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    startup = sub.add_parser("startup", help="wait for the desktop and report stage timings")
+    startup.add_argument("--timeout", type=float, default=120)
+    startup.set_defaults(func=cmd_startup)
+
+    idle = sub.add_parser("idle", help="idle RSS and CPU per supervised program")
+    idle.add_argument("--seconds", type=float, default=30)
+    idle.set_defaults(func=cmd_idle)
+
+    rfb = sub.add_parser("rfb", help="framebuffer update throughput under a redraw workload")
+    rfb.add_argument("--port", type=int, default=int(os.environ.get("VNC_PORT", 5901)))
+    rfb.add_argument("--seconds", type=float, default=10)
+    rfb.add_argument("--mode", choices=("full", "incremental"), default="full")
+    rfb.add_argument("--display", default=os.environ.get("DISPLAY", ":1"))
+    rfb.add_argument("--encoding", choices=sorted(ENCODINGS), default="zrle")
+    rfb.add_argument("--redraw-fps", type=float, default=25,
+                     help="rate of the scripted redraw workload on the display")
+    rfb.set_defaults(func=cmd_rfb)
+
+    swing = sub.add_parser("swing", help="cold Swing startup with and without CDS")
+    swing.add_argument("--runs", type=int, default=5)
+    swing.add_argument("--timeout", type=float, default=60, help="seconds allowed per run")
+    swing.set_defaults(func=cmd_swing)
+
+    args = parser.parse_args()
+    result = args.func(args)
+    json.dump(result, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+    return 1 if "error" in result else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
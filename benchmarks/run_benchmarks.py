@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""Startup and steady-state benchmarks for the XFCE + OpenJDK image.
+
+Runs entirely against a locally built image with networking disabled:
+
+  * image size, total and per layer
+  * time from container start to Xvfb ready, VNC port accepting and
+    xfce4-session up (median over --runs fresh containers)
+  * idle RSS and CPU of every program under supervisord, and the per-session
+    cost of the pod when SESSION_COUNT runs several desktops
+  * framebuffer update throughput from a scripted RFB client while a
+    scripted redraw workload repaints part of the screen
+  * cold Swing startup with no class sharing, the JDK default CDS archive
+    and the image's desktop CDS archive
+
+Results are written as JSON and compared against the baseline recorded
+with the same --env settings; the exit status is 1 when any metric
+regresses beyond its threshold, or when no baseline has been recorded for
+this environment yet.
+
+    python3 benchmarks/run_benchmarks.py --image xfce-openjdk21:dev
+    python3 benchmarks/run_benchmarks.py --image xfce-openjdk21:dev --update-baseline
+"""
+
+import argparse
+import fnmatch
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PROBE = os.path.join(HERE, "desktop_probe.py")
+PROBE_PATH = "/tmp/desktop_probe.py"
+
+
+def log(message):
+    print("[%s] BENCHMARK: %s" % (time.strftime("%Y-%m-%d %H:%M:%S"), message),
+          file=sys.stderr)
+
+
+class Engine:
+    """Thin wrapper around the docker/podman CLI."""
+
+    def __init__(self, binary):
+        self.binary = binary
+
+    def run(self, *args, check=True):
+        result = subprocess.run([self.binary] + list(args), stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE, text=True)
+        if check and result.returncode != 0:
+            raise RuntimeError("%s %s failed: %s" % (self.binary, args[0], result.stderr.strip()))
+        return result
+
+    def probe(self, container, *args):
+        result = self.run("exec", container, "python3", PROBE_PATH, *args, check=False)
+        try:
+            return json.loads(result.stdout)
+        except ValueError:
+            raise RuntimeError("probe %s failed: %s" % (args[0], result.stderr.strip()))
+
+
+def image_metrics(engine, image):
+    size = int(engine.run("image", "inspect", "--format", "{{.Size}}", image).stdout.strip())
+    history = engine.run("history", "--no-trunc", "--human=false", "--format",
+                         "{{.Size}}\t{{.CreatedBy}}", image).stdout
+    layers = []
+    for line in history.splitlines():
+        layer_size, _, created_by = line.partition("\t")
+        if layer_size.isdigit():
+            layers.append({"size_bytes": int(layer_size), "created_by": created_by.strip()})
+    return {"size_bytes": size, "layers": layers}
+
+
+def start_container(engine, image, env):
+    args = ["run", "-d", "--network", "none"]
+    for item in env:
+        args += ["-e", item]
+    container = engine.run(*(args + [image])).stdout.strip()
+    engine.run("cp", PROBE, "%s:%s" % (container, PROBE_PATH))
+    return container
+
+
+def run_suite(engine, args):
+    results = {"image": image_metrics(engine, args.image), "startup_runs": []}
+
+    for run in range(1, args.runs + 1):
+        log("Startup run %d/%d..." % (run, args.runs))
+        container = start_container(engine, args.image, args.env)
+        try:
+            startup = engine.probe(container, "startup", "--timeout", str(args.timeout))
+            if "error" in startup:
+                raise RuntimeError(startup["error"])
+            results["startup_runs"].append(startup)
+
+            if run == args.runs:
+                log("Measuring idle footprint for %ss..." % args.idle_seconds)
+                results["idle"] = engine.probe(container, "idle", "--seconds", str(args.idle_seconds))
+                if "error" in results["idle"]:
+                    raise RuntimeError(results["idle"]["error"])
+                log("Measuring framebuffer throughput for %ss..." % args.rfb_seconds)
+                results["rfb"] = {
+                    mode: engine.probe(container, "rfb", "--mode", mode, "--seconds", str(args.rfb_seconds),
+                                       "--encoding", args.rfb_encoding)
+                    for mode in ("full", "incremental")
+                }
+                log("Measuring cold Swing startup...")
+                results["swing"] = engine.probe(container, "swing")
+                if "error" in results["swing"]:
+                    log("WARNING: skipping Swing metrics: %s" % results["swing"]["error"])
+        finally:
+            engine.run("rm", "-f", container, check=False)
+
+    results["startup"] = {
+        key: statistics.median(run[key] for run in results["startup_runs"])
+        for key in results["startup_runs"][0] if key.endswith("_ms")
+    }
+    results["density"] = density(results["startup_runs"][-1]["sessions"], results["idle"])
+    return results
+
+
+def density(sessions, idle):
+    """Per-session cost of the whole pod, for comparing SESSION_COUNT settings."""
+    rss = sum(values["rss_bytes"] for values in idle.values())
+    cpu = sum(values["cpu_percent"] for values in idle.values())
+    result = {
+        "sessions": sessions,
+        "rss_bytes_per_session": int(rss / sessions),
+        "cpu_percent_per_session": round(cpu / sessions, 2),
+        "sessions_per_gib": round(sessions * 2 ** 30 / rss, 2),
+    }
+    if cpu > 0:
+        result["sessions_per_core"] = round(sessions * 100.0 / cpu, 2)
+    return result
+
+
+def flatten(results):
+    """Reduce the raw results to the named metrics compared against the baseline."""
+    metrics = {"image.size_bytes": results["image"]["size_bytes"],
+               "image.layer_count": len(results["image"]["layers"])}
+    for key, value in results["startup"].items():
+        metrics["startup.%s" % key] = value
+    for program, values in results["idle"].items():
+        for key, value in values.items():
+            metrics["idle.%s.%s" % (program, key)] = value
+    for key, value in results["density"].items():
+        metrics["density.%s" % key] = value
+    if "error" not in results["swing"]:
+        for key, value in results["swing"].items():
+            metrics["swing.%s" % key] = value
+    for mode, values in results["rfb"].items():
+        metrics["rfb.%s.frames_per_second" % mode] = values["frames_per_second"]
+        metrics["rfb.%s.bytes_per_second" % mode] = values["bytes_per_second"]
+    return metrics
+
+
+def find_baseline(baseline, env):
+    """The recorded baseline whose container environment matches env."""
+    return next((entry for entry in baseline.get("baselines", [])
+                 if sorted(entry["env"]) == sorted(env)), None)
+
+
+def write_baseline(baseline, path):
+    """Write the baseline file with one threshold rule per line."""
+    text = json.dumps(dict(baseline, thresholds=[]), indent=2)
+    rules = ",\n".join("    " + json.dumps(rule) for rule in baseline["thresholds"])
+    text = text.replace('"thresholds": []', '"thresholds": [\n%s\n  ]' % rules, 1)
+    with open(path, "w") as handle:
+        handle.write(text + "\n")
+
+
+def compare(metrics, reference_metrics, thresholds):
+    """Check each metric against the first matching threshold rule."""
+    findings = []
+    for name, value in sorted(metrics.items()):
+        reference = reference_metrics.get(name)
+        rule = next((r for r in thresholds if fnmatch.fnmatch(name, r["metric"])), None)
+        if reference is None or rule is None:
+            continue
+        delta = value - reference
+        if abs(delta) <= rule.get("tolerance", 0):
+            status = "ok"
+        elif "max_increase_pct" in rule:
+            status = "regression" if delta > reference * rule["max_increase_pct"] / 100.0 else "ok"
+        else:
+            status = "regression" if -delta > reference * rule["max_decrease_pct"] / 100.0 else "ok"
+        findings.append({"metric": name, "baseline": reference, "value": value, "status": status})
+    return findings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--image", required=True, help="locally built image to benchmark")
+    parser.add_argument("--engine", default=shutil.which("docker") or "podman")
+    parser.add_argument("--runs", type=int, default=3, help="fresh containers for startup timings")
+    parser.add_argument("--timeout", type=float, default=120, help="seconds to wait for the session")
+    parser.add_argument("--idle-seconds", type=float, default=30)
+    parser.add_argument("--rfb-seconds", type=float, default=10)
+    parser.add_argument("--rfb-encoding", choices=("zrle", "tight", "raw"), default="zrle",
+                        help="encoding the RFB client asks for, besides CopyRect and Raw")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra container environment, may be repeated")
+    parser.add_argument("--baseline", default=os.path.join(HERE, "baseline.json"))
+    parser.add_argument("--output", default="bench_output.json")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="store this run's metrics as the new baseline")
+    args = parser.parse_args()
+
+    engine = Engine(args.engine)
+    results = run_suite(engine, args)
+    results["metrics"] = flatten(results)
+
+    with open(args.baseline) as handle:
+        baseline = json.load(handle)
+    # Tuning presets and session counts differ by design, so each --env
+    # combination is only ever compared against its own recorded baseline
+    reference = find_baseline(baseline, args.env)
+    results["comparison"] = compare(results["metrics"], reference["metrics"] if reference else {},
+                                    baseline["thresholds"])
+
+    with open(args.output, "w") as handle:
+        json.dump(results, handle, indent=2)
+        handle.write("\n")
+    log("Results written to %s" % args.output)
+
+    if args.update_baseline:
+        entry = {"env": sorted(args.env), "image": args.image, "metrics": results["metrics"]}
+        baseline["baselines"] = [e for e in baseline.get("baselines", []) if e is not reference]
+        baseline["baselines"].append(entry)
+        write_baseline(baseline, args.baseline)
+        log("Baseline for env %s updated: %s" % (entry["env"], args.baseline))
+        return 0
+
+    if reference is None:
+        log("ERROR: no baseline recorded for env %s in %s, run with --update-baseline on reference hardware"
+            % (sorted(args.env), args.baseline))
+        return 1
+    regressions = [f for f in results["comparison"] if f["status"] == "regression"]
+    for finding in regressions:
+        log("REGRESSION: %(metric)s %(value)s (baseline %(baseline)s)" % finding)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+// Class-loading workload for the image's default CDS archive
+// Builds and paints a typical Swing window so that the java.desktop, AWT,
+// Java2D and Swing classes a GUI application needs at startup end up in
+// the class list dumped by build-cds-archive.sh. Exits as soon as the first
+// frame has been painted, which also makes it a cold-start benchmark.
+
+import java.awt.BorderLayout;
+import java.awt.Component;
+import java.awt.Container;
+import java.awt.Dimension;
+import java.awt.Graphics;
+import java.awt.Graphics2D;
+import java.awt.GraphicsEnvironment;
+import java.awt.RenderingHints;
+import java.awt.image.BufferedImage;
+import java.util.concurrent.CountDownLatch;
+import java.util.concurrent.TimeUnit;
+import javax.swing.BorderFactory;
+import javax.swing.JButton;
+import javax.swing.JCheckBox;
+import javax.swing.JComboBox;
+import javax.swing.JComponent;
+import javax.swing.JFrame;
+import javax.swing.JLabel;
+import javax.swing.JList;
+import javax.swing.JMenu;
+import javax.swing.JMenuBar;
+import javax.swing.JMenuItem;
+import javax.swing.JPanel;
+import javax.swing.JProgressBar;
+import javax.swing.JScrollPane;
+import javax.swing.JSplitPane;
+import javax.swing.JTabbedPane;
+import javax.swing.JTable;
+import javax.swing.JTextArea;
+import javax.swing.JTextField;
+import javax.swing.JToolBar;
+import javax.swing.JTree;
+import javax.swing.SwingUtilities;
+import javax.swing.UIManager;
+
+public class DesktopWarmup {
+
+    // Upper bound for the first paint, so a wedged X server fails the build
+    // or benchmark instead of hanging it
+    private static final long PAINT_TIMEOUT_SECONDS = 30;
+
+    public static void main(String[] args) throws Exception {
+        CountDownLatch painted = new CountDownLatch(1);
+
+        SwingUtilities.invokeAndWait(() -> {
+            JPanel content = buildContent();
+            if (GraphicsEnvironment.isHeadless()) {
+                // No display: still exercise layout and Java2D rendering
+                content.setSize(new Dimension(800, 600));
+                layoutTree(content);
+                paintOffscreen(content);
+                painted.countDown();
+                return;
+            }
+
+            JFrame frame = new JFrame("DesktopWarmup") {
+                @Override
+                public void paint(Graphics g) {
+                    super.paint(g);
+                    painted.countDown();
+                }
+            };
+            frame.setJMenuBar(buildMenuBar());
+            frame.setContentPane(content);
+            frame.setDefaultCloseOperation(JFrame.DISPOSE_ON_CLOSE);
+            frame.pack();
+            frame.setVisible(true);
+            paintOffscreen(content);
+        });
+
+        if (!painted.await(PAINT_TIMEOUT_SECONDS, TimeUnit.SECONDS)) {
+            System.err.println("DesktopWarmup: no frame painted after "
+                    + PAINT_TIMEOUT_SECONDS + "s");
+            System.exit(1);
+        }
+        System.exit(0);
+    }
+
+    private static JMenuBar buildMenuBar() {
+        JMenuBar bar = new JMenuBar();
+        JMenu file = new JMenu("File");
+        file.add(new JMenuItem("Open"));
+        file.addSeparator();
+        file.add(new JMenuItem("Exit"));
+        bar.add(file);
+        return bar;
+    }
+
+    private static JPanel buildContent() {
+        UIManager.getLookAndFeelDefaults();
+
+        JToolBar toolbar = new JToolBar();
+        toolbar.add(new JButton("Run"));
+        toolbar.add(new JCheckBox("Verbose", true));
+        toolbar.add(new JComboBox<>(new String[] {"One", "Two", "Three"}));
+        toolbar.add(new JTextField("search", 12));
+
+        JTable table = new JTable(new Object[][] {{"a", 1, true}, {"b", 2, false}},
+                new Object[] {"Name", "Value", "Enabled"});
+        JTabbedPane tabs = new JTabbedPane();
+        tabs.addTab("Table", new JScrollPane(table));
+        tabs.addTab("Text", new JScrollPane(new JTextArea("DesktopWarmup\n", 10, 40)));
+        tabs.addTab("List", new JScrollPane(new JList<>(new String[] {"alpha", "beta"})));
+
+        JSplitPane split = new JSplitPane(JSplitPane.HORIZONTAL_SPLIT,
+                new JScrollPane(new JTree()), tabs);
+
+        JProgressBar progress = new JProgressBar(0, 100);
+        progress.setValue(42);
+        progress.setStringPainted(true);
+
+        JPanel status = new JPanel(new BorderLayout());
+        status.setBorder(BorderFactory.createEtchedBorder());
+        status.add(new JLabel("Ready"), BorderLayout.WEST);
+        status.add(progress, BorderLayout.EAST);
+
+        JPanel content = new JPanel(new BorderLayout());
+        content.add(toolbar, BorderLayout.NORTH);
+        content.add(split, BorderLayout.CENTER);
+        content.add(status, BorderLayout.SOUTH);
+        content.setPreferredSize(new Dimension(800, 600));
+        return content;
+    }
+
+    private static void layoutTree(Container container) {
+        container.doLayout();
+        for (Component child : container.getComponents()) {
+            if (child instanceof Container) {
+                layoutTree((Container) child);
+            }
+        }
+    }
+
+    private static void paintOffscreen(JComponent component) {
+        BufferedImage image = new BufferedImage(800, 600, BufferedImage.TYPE_INT_ARGB);
+        Graphics2D g = image.createGraphics();
+        g.setRenderingHint(RenderingHints.KEY_TEXT_ANTIALIASING,
+                RenderingHints.VALUE_TEXT_ANTIALIAS_ON);
+        component.paint(g);
+        g.dispose();
+    }
+}
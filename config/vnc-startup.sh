@@ -1,95 +1,307 @@
 #!/bin/bash
 # VNC startup script for XFCE desktop environment
-# Starts XFCE with VNC server for remote access
+# Starts one component of a desktop session; supervisord runs each as its own
+# program so a crashed component is restarted without tearing down the rest:
+#
+#   vnc-startup.sh xvfb     - virtual framebuffer X server
+#   vnc-startup.sh dbus     - D-Bus session bus (xfconf settings)
+#   vnc-startup.sh x11vnc   - VNC server, once the display accepts clients
+#   vnc-startup.sh wm       - xfwm4 on its own (headless-app profile)
+#   vnc-startup.sh session  - xfce4-session, or APP_COMMAND in headless-app
+#
 # Enhanced for Iron Bank compliance and EPEL-based XFCE
 
 set -e
 
+COMPONENT=${1:-}
+case "$COMPONENT" in
+    xvfb|dbus|x11vnc|wm|session) ;;
+    *)
+        echo "Usage: $0 xvfb|dbus|x11vnc|wm|session" >&2
+        exit 2
+        ;;
+esac
+
 # Set default values if not provided
 VNC_PORT=${VNC_PORT:-5901}
 VNC_RESOLUTION=${VNC_RESOLUTION:-1280x1024}
 VNC_COL_DEPTH=${VNC_COL_DEPTH:-24}
 DISPLAY=${DISPLAY:-:1}
 
+# Multi-session mode: supervisord runs SESSION_COUNT copies of each component
+# with SESSION_INDEX 1..N; session N uses display :(base + N - 1) and port
+# VNC_PORT + N - 1, where DISPLAY and VNC_PORT give the base for session 1
+SESSION_INDEX=${SESSION_INDEX:-1}
+DISPLAY_BASE=${DISPLAY#:}
+DISPLAY=":$(( ${DISPLAY_BASE%%.*} + SESSION_INDEX - 1 ))"
+VNC_PORT=$(( VNC_PORT + SESSION_INDEX - 1 ))
+
+# Session profile: "full" runs xfce4-session, "headless-app" runs xfwm4 and
+# APP_COMMAND directly (see the headless-app Dockerfile target)
+DESKTOP_PROFILE=${DESKTOP_PROFILE:-full}
+APP_COMMAND=${APP_COMMAND:-}
+
+# Framebuffer placement: "memory" keeps it private to Xvfb, "shm" maps it
+# from a file under XVFB_FBDIR (a tmpfs such as /dev/shm) so x11vnc and
+# capture tools read pixels directly instead of through X requests
+XVFB_FRAMEBUFFER=${XVFB_FRAMEBUFFER:-memory}
+XVFB_FBDIR=${XVFB_FBDIR:-/dev/shm/xvfb}
+export XVFB_FBDIR
+
+DISPLAY_NUM=${DISPLAY#:}
+DISPLAY_NUM=${DISPLAY_NUM%%.*}
+X_SOCKET=/tmp/.X11-unix/X${DISPLAY_NUM}
+X_LOCK=/tmp/.X${DISPLAY_NUM}-lock
+
+# Per-session state: connection details and startup timings (milliseconds
+# since container start) for probes and benchmarks
+DESKTOP_STATE_DIR=${DESKTOP_STATE_DIR:-/tmp/desktop}/session-$SESSION_INDEX
+TIMINGS_FILE=$DESKTOP_STATE_DIR/timings
+DISPLAYFD_FILE=$DESKTOP_STATE_DIR/xvfb.displayfd
+
+# Per-session runtime directory, holding the session's D-Bus socket
+SESSION_RUNTIME_DIR=/tmp/runtime-root/session-$SESSION_INDEX
+DBUS_SOCKET=$SESSION_RUNTIME_DIR/bus
+
 # Function to log messages with timestamp
 log() {
-    echo "[$(date '+%Y-%m-%d %H:%M:%S')] VNC: $1"
+    echo "[$(date '+%Y-%m-%d %H:%M:%S')] VNC[$SESSION_INDEX/$COMPONENT]: $1"
+}
+
+# now_ms and wait_until, with the READY_* tuning variables; found on PATH
+# like xvfb-framebuffer.sh
+. desktop-readiness.sh
+
+# Append "<stage>=<ms since container start>" to the timings file. Each
+# stage is recorded once per display (the file is reset when Xvfb starts),
+# so restarts of x11vnc or the session do not overwrite startup timings
+record_timing() {
+    grep -q "^$1=" "$TIMINGS_FILE" 2>/dev/null && return 0
+    echo "$1=$(( $(now_ms) - CONTAINER_START_MS ))" >> "$TIMINGS_FILE"
 }
 
-log "Starting XFCE desktop with VNC server (EPEL-based)..."
+# Readiness checks (pattern anchored so :1 does not match :10)
+no_stale_xvfb() {
+    ! pgrep -f "Xvfb $DISPLAY( |$)"
+}
+
+xvfb_ready() {
+    # Xvfb writes the display number to -displayfd once it accepts clients;
+    # a real connection rules out files left behind by a killed server
+    [ -s "$DISPLAYFD_FILE" ] && [ -S "$X_SOCKET" ] && xdpyinfo -display "$DISPLAY"
+}
+
+dbus_ready() {
+    # A stale socket from a killed bus does not answer
+    dbus-send --bus="unix:path=$DBUS_SOCKET" --print-reply --dest=org.freedesktop.DBus \
+        /org/freedesktop/DBus org.freedesktop.DBus.GetId
+}
 
-# Kill any existing X servers on this display
-log "Cleaning up any existing X servers on display $DISPLAY..."
-pkill -f "Xvfb $DISPLAY" || true
-pkill -f "x11vnc.*$DISPLAY" || true
-sleep 2
+vnc_listening() {
+    (exec 3<>"/dev/tcp/127.0.0.1/$VNC_PORT") 2>/dev/null
+}
 
-# Start Xvfb (virtual framebuffer X server)
-log "Starting Xvfb on display $DISPLAY with resolution ${VNC_RESOLUTION}x${VNC_COL_DEPTH}..."
-Xvfb $DISPLAY -screen 0 ${VNC_RESOLUTION}x${VNC_COL_DEPTH} -ac +extension GLX +render -noreset &
-XVFB_PID=$!
+# Block until Xvfb accepts clients; supervisord starts all components at
+# once, priorities only order them
+wait_for_display() {
+    log "Waiting for display $DISPLAY..."
+    wait_until "Xvfb" - xvfb_ready
+}
 
-# Wait for X server to be fully ready
-log "Waiting for X server to be ready..."
-sleep 5
+start_xvfb() {
+    log "Starting Xvfb on display $DISPLAY with resolution ${VNC_RESOLUTION}x${VNC_COL_DEPTH}..."
 
-# Verify X server is running
-if ! xdpyinfo -display $DISPLAY >/dev/null 2>&1; then
-    log "ERROR: X server failed to start on display $DISPLAY"
-    kill $XVFB_PID 2>/dev/null || true
-    exit 1
-fi
+    # Timings describe the current display, so a restarted Xvfb starts
+    # them afresh
+    echo "container_start=$CONTAINER_START_MS" > "$TIMINGS_FILE"
+    cat > "$DESKTOP_STATE_DIR/session.env" <<EOF
+SESSION_INDEX=$SESSION_INDEX
+DISPLAY=$DISPLAY
+VNC_PORT=$VNC_PORT
+EOF
 
-log "X server successfully started on display $DISPLAY"
+    # Remove leftovers of a previous server on this display
+    rm -f "$DISPLAYFD_FILE"
+    pkill -f "Xvfb $DISPLAY( |$)" || true
+    wait_until "Cleanup" - no_stale_xvfb
+    rm -f "$X_LOCK" "$X_SOCKET"
 
-# Set the DISPLAY environment variable for all processes
-export DISPLAY
+    # Place the framebuffer in shared memory if requested and there is room
+    local fb_args=""
+    if [ "$XVFB_FRAMEBUFFER" = "shm" ]; then
+        local fb_dir fb_bytes fb_avail
+        fb_dir=$(xvfb-framebuffer.sh dir)
+        mkdir -p "$fb_dir"
+        rm -f "$fb_dir/Xvfb_screen0"
+        # 32 bits per pixel for depth 24, plus header and colormap
+        fb_bytes=$(( ${VNC_RESOLUTION%x*} * ${VNC_RESOLUTION#*x} * 4 + 65536 ))
+        fb_avail=$(df -P -k "$fb_dir" | awk 'NR == 2 { print $4 * 1024 }')
+        if [ "$fb_avail" -ge "$fb_bytes" ]; then
+            log "Using shared-memory framebuffer in $fb_dir ($fb_bytes bytes)"
+            fb_args="-fbdir $fb_dir"
+        else
+            log "WARNING: $fb_dir has $fb_avail bytes free, $fb_bytes needed; using private framebuffer"
+        fi
+    fi
+
+    # Record readiness in the background; $$ is the Xvfb pid after exec
+    (
+        wait_until "Xvfb" $$ xvfb_ready || exit 0
+        record_timing xvfb_ready
+    ) &
+
+    exec Xvfb $DISPLAY -screen 0 ${VNC_RESOLUTION}x${VNC_COL_DEPTH} -ac +extension GLX +render -noreset \
+         $fb_args -displayfd 3 3>"$DISPLAYFD_FILE"
+}
+
+# Resolve the x11vnc tuning profile: lan, wan or batch. The profile only
+# provides defaults, every individual VNC_* setting can override it. Only
+# the x11vnc component reads these, so a bad value cannot take down the
+# display or the session.
+resolve_vnc_tuning() {
+    local fps ncache threads
+    VNC_TUNING=${VNC_TUNING:-lan}
+    case "$VNC_TUNING" in
+        lan)   fps=50; ncache=0; threads=true ;;
+        wan)   fps=15; ncache=6; threads=true ;;
+        batch) fps=5;  ncache=0; threads=false ;;
+        *)
+            log "ERROR: unknown VNC_TUNING profile '$VNC_TUNING' (expected lan, wan or batch)"
+            return 1
+            ;;
+    esac
+    VNC_XDAMAGE=${VNC_XDAMAGE:-true}
+    VNC_MAX_FPS=${VNC_MAX_FPS:-$fps}
+    if ! [ "$VNC_MAX_FPS" -ge 1 ] 2>/dev/null; then
+        log "ERROR: VNC_MAX_FPS must be a positive integer, got '$VNC_MAX_FPS'"
+        return 1
+    fi
+    VNC_POLL_WAIT=${VNC_POLL_WAIT:-$(( 1000 / VNC_MAX_FPS ))}
+    VNC_DEFER=${VNC_DEFER:-$(( 1000 / VNC_MAX_FPS ))}
+    VNC_NCACHE=${VNC_NCACHE:-$ncache}
+    if ! [ "$VNC_NCACHE" -ge 0 ] 2>/dev/null; then
+        log "ERROR: VNC_NCACHE must be a non-negative integer, got '$VNC_NCACHE'"
+        return 1
+    fi
+    VNC_THREADS=${VNC_THREADS:-$threads}
+    VNC_EXTRA_ARGS=${VNC_EXTRA_ARGS:-}
+}
+
+start_x11vnc() {
+    resolve_vnc_tuning
+    wait_for_display
+
+    # VNC authentication (default: no password for development, should be configured for production)
+    local auth_args tuning_args
+    if [ -n "${VNC_PASSWORD:-}" ]; then
+        x11vnc -storepasswd "$VNC_PASSWORD" "$DESKTOP_STATE_DIR/passwd"
+        auth_args="-rfbauth $DESKTOP_STATE_DIR/passwd"
+    else
+        log "WARNING: VNC running without password authentication"
+        auth_args="-nopw"
+    fi
+
+    # Polling, encoding and threading options from the tuning profile
+    tuning_args="-wait $VNC_POLL_WAIT -defer $VNC_DEFER"
+    if [ "$VNC_XDAMAGE" = "true" ]; then
+        tuning_args="$tuning_args -xdamage"
+    else
+        tuning_args="$tuning_args -noxdamage"
+    fi
+    if [ "$VNC_NCACHE" -gt 0 ]; then
+        tuning_args="$tuning_args -ncache $VNC_NCACHE -ncache_cr"
+    else
+        tuning_args="$tuning_args -noncache"
+    fi
+    if [ "$VNC_THREADS" = "true" ]; then
+        tuning_args="$tuning_args -threads"
+    else
+        tuning_args="$tuning_args -nothreads"
+    fi
+    # Poll the shared-memory framebuffer in place; the "+map:" form keeps
+    # $DISPLAY open for input and DAMAGE. Xvfb may have fallen back to a
+    # private framebuffer if /dev/shm was full
+    if [ "$XVFB_FRAMEBUFFER" = "shm" ]; then
+        if [ -s "$(xvfb-framebuffer.sh file)" ]; then
+            tuning_args="$tuning_args -rawfb $(xvfb-framebuffer.sh rawfb)"
+        else
+            log "WARNING: no shared-memory framebuffer for $DISPLAY, reading it through X"
+        fi
+    fi
+    log "x11vnc tuning: $VNC_TUNING ($tuning_args $VNC_EXTRA_ARGS)"
+
+    # x11vnc replaces this shell (same pid), so the watcher fails fast if it exits
+    (
+        wait_until "x11vnc" $$ vnc_listening || exit 0
+        record_timing vnc_ready
+    ) &
+
+    log "Starting x11vnc VNC server on port $VNC_PORT..."
+    exec x11vnc -display $DISPLAY \
+         -forever \
+         -shared \
+         -rfbport $VNC_PORT \
+         $auth_args \
+         -cursor arrow \
+         $tuning_args \
+         $VNC_EXTRA_ARGS
+}
+
+start_dbus() {
+    mkdir -p -m 700 "$SESSION_RUNTIME_DIR"
+    rm -f "$DBUS_SOCKET"
+    log "Starting D-Bus session bus at $DBUS_SOCKET..."
+    exec dbus-daemon --session --nofork --nopidfile --address="unix:path=$DBUS_SOCKET"
+}
+
+# Setup session environment; xfwm4 and xfce4-session read their settings
+# through xfconf on the session bus
+session_env() {
+    export DISPLAY
+    export XDG_SESSION_TYPE=x11
+    export XDG_RUNTIME_DIR=$SESSION_RUNTIME_DIR
+    mkdir -p -m 700 "$XDG_RUNTIME_DIR"
+    wait_until "D-Bus" - dbus_ready
+    export DBUS_SESSION_BUS_ADDRESS="unix:path=$DBUS_SOCKET"
+}
+
+start_wm() {
+    wait_for_display
+    session_env
+    log "Starting window manager..."
+    exec xfwm4 --compositor=off
+}
+
+start_session() {
+    wait_for_display
+    session_env
+
+    if [ "$DESKTOP_PROFILE" = "headless-app" ]; then
+        # The window manager runs as its own program; run the application here
+        if [ -z "$APP_COMMAND" ]; then
+            log "WARNING: APP_COMMAND not set, running the window manager only"
+            record_timing session_exec
+            exec sleep infinity
+        fi
+        log "Starting application: $APP_COMMAND"
+        record_timing session_exec
+        exec /bin/sh -c "exec $APP_COMMAND"
+    fi
+
+    # Start XFCE session
+    log "Starting XFCE desktop session..."
+    record_timing session_exec
+    exec xfce4-session
+}
 
-# Start x11vnc VNC server
-# VNC authentication (default: no password for development, should be configured for production)
-VNC_PASSWORD=${VNC_PASSWORD:-}
-
-# Start x11vnc VNC server
-log "Starting x11vnc VNC server on port $VNC_PORT..."
-
-if [ -n "$VNC_PASSWORD" ]; then
-    # Create password file if VNC_PASSWORD is set
-    mkdir -p /root/.vnc
-    x11vnc -storepasswd "$VNC_PASSWORD" /root/.vnc/passwd
-    VNC_AUTH_ARGS="-rfbauth /root/.vnc/passwd"
-else
-    log "WARNING: VNC running without password authentication"
-    VNC_AUTH_ARGS="-nopw"
-fi
-
-x11vnc -display $DISPLAY \
-       -forever \
-       -shared \
-       -rfbport $VNC_PORT \
-       -bg \
-       $VNC_AUTH_ARGS \
-       -cursor arrow \
-       -o /tmp/x11vnc.log
-
-# Wait for VNC server to start
-sleep 3
-
-# Verify VNC server is running
-if ! pgrep -f "x11vnc.*$DISPLAY" > /dev/null; then
-    log "ERROR: VNC server failed to start"
-    kill $XVFB_PID 2>/dev/null || true
-    exit 1
-fi
-
-log "VNC server successfully started on port $VNC_PORT"
-
-# Setup XFCE environment
-log "Setting up XFCE environment..."
+CONTAINER_START_MS=${CONTAINER_START_MS:-$(now_ms)}
+mkdir -p "$DESKTOP_STATE_DIR"
 export DISPLAY
-export XDG_SESSION_TYPE=x11
-export XDG_RUNTIME_DIR=/tmp/runtime-root
-mkdir -p "$XDG_RUNTIME_DIR"
 
-# Start XFCE session
-log "Starting XFCE desktop session..."
-exec xfce4-session
+case "$COMPONENT" in
+    xvfb)    start_xvfb ;;
+    dbus)    start_dbus ;;
+    x11vnc)  start_x11vnc ;;
+    wm)      start_wm ;;
+    session) start_session ;;
+esac
@@ -0,0 +1,134 @@
+#!/bin/bash
+# Class Data Sharing (CDS) archive builder for Java GUI applications
+#
+#   build-cds-archive.sh desktop <archive.jsa>
+#       Default archive shipped with the image: a static archive of the
+#       java.base, java.desktop, AWT, Java2D and Swing classes loaded by
+#       DesktopWarmup while it paints a window on a temporary Xvfb.
+#
+#   build-cds-archive.sh app <archive.jsa> [seconds] -- <java arguments...>
+#       AppCDS hook for derived images: runs the application for a training
+#       period (default 30s) and dumps a dynamic archive layered on top of the
+#       desktop archive. Use it at runtime with -XX:SharedArchiveFile=<archive>
+#       and the same class path as the training run.
+
+set -e
+
+CDS_HOME=${CDS_HOME:-/opt/java-cds}
+DESKTOP_CDS_ARCHIVE=${DESKTOP_CDS_ARCHIVE:-$CDS_HOME/desktop.jsa}
+WARMUP_SOURCE=${WARMUP_SOURCE:-$CDS_HOME/DesktopWarmup.java}
+BUILD_DISPLAY=${BUILD_DISPLAY:-:99}
+
+# Function to log messages with timestamp
+log() {
+    echo "[$(date '+%Y-%m-%d %H:%M:%S')] CDS: $1"
+}
+
+# Build flags must not leak into the training or dump runs
+unset JAVA_TOOL_OPTIONS
+
+# wait_until, shared with vnc-startup.sh
+. desktop-readiness.sh
+
+# Xvfb writes the display number to -displayfd once it accepts clients
+build_display_ready() {
+    [ -s "$1" ] && xdpyinfo -display "$BUILD_DISPLAY"
+}
+
+# Run a command against a private Xvfb unless a display is already usable
+with_display() {
+    if [ -n "$DISPLAY" ] && xdpyinfo -display "$DISPLAY" >/dev/null 2>&1; then
+        "$@"
+        return
+    fi
+
+    local xvfb_pid displayfd status=0
+    displayfd=$(mktemp)
+    Xvfb "$BUILD_DISPLAY" -screen 0 1280x1024x24 -ac +render -noreset \
+        -displayfd 3 3>"$displayfd" >/dev/null 2>&1 &
+    xvfb_pid=$!
+    if wait_until "Xvfb $BUILD_DISPLAY" "$xvfb_pid" build_display_ready "$displayfd"; then
+        DISPLAY=$BUILD_DISPLAY "$@" || status=$?
+    else
+        status=1
+    fi
+    kill "$xvfb_pid" 2>/dev/null || true
+    wait "$xvfb_pid" 2>/dev/null || true
+    rm -f "$displayfd"
+    return $status
+}
+
+build_desktop() {
+    local archive=$1 workdir classlist
+    workdir=$(mktemp -d)
+    classlist=$workdir/desktop.classlist
+
+    if java --list-modules | grep -q '^jdk.compiler@'; then
+        log "Compiling $WARMUP_SOURCE..."
+        java -m jdk.compiler/com.sun.tools.javac.Main -d "$CDS_HOME/classes" "$WARMUP_SOURCE"
+
+        log "Recording classes loaded by a Swing startup..."
+        if ! with_display java -Xshare:off -XX:DumpLoadedClassList="$classlist.raw" \
+                -cp "$CDS_HOME/classes" DesktopWarmup; then
+            log "WARNING: X11 toolkit unavailable, recording a headless Swing startup"
+            java -Xshare:off -Djava.awt.headless=true -XX:DumpLoadedClassList="$classlist.raw" \
+                -cp "$CDS_HOME/classes" DesktopWarmup
+        fi
+        # Keep JDK classes only, so the archive does not depend on a class path;
+        # this also drops the "@lambda-proxy DesktopWarmup ..." entries
+        grep -v 'DesktopWarmup' "$classlist.raw" > "$classlist"
+    else
+        log "WARNING: jdk.compiler module not available, using the JDK default class list"
+        cp "$JAVA_HOME/lib/classlist" "$classlist"
+    fi
+
+    log "Dumping $(grep -c -v '^[#@]' "$classlist") classes to $archive..."
+    mkdir -p "$(dirname "$archive")"
+    java -Xshare:dump -XX:SharedClassListFile="$classlist" -XX:SharedArchiveFile="$archive"
+    chmod 644 "$archive"
+    rm -rf "$workdir"
+    log "Desktop CDS archive written: $archive ($(du -h "$archive" | cut -f1))"
+}
+
+build_app() {
+    local archive=$1 seconds=30
+    shift
+    if [ "${1:-}" != "--" ]; then
+        seconds=$1
+        shift
+    fi
+    if [ "${1:-}" != "--" ] || [ $# -lt 2 ]; then
+        echo "Usage: $0 app <archive.jsa> [seconds] -- <java arguments...>" >&2
+        exit 2
+    fi
+    shift
+
+    log "Training application for ${seconds}s to build $archive..."
+    mkdir -p "$(dirname "$archive")"
+    # The archive is written when the JVM exits, including on SIGTERM
+    with_display timeout --signal=TERM "$seconds" \
+        java -XX:SharedArchiveFile="$DESKTOP_CDS_ARCHIVE" -XX:ArchiveClassesAtExit="$archive" "$@" || true
+
+    if [ ! -s "$archive" ]; then
+        log "ERROR: no archive written, check that the application runs and exits cleanly"
+        exit 1
+    fi
+    log "Application CDS archive written: $archive ($(du -h "$archive" | cut -f1))"
+}
+
+case "${1:-}" in
+    desktop)
+        [ -n "${2:-}" ] || { echo "Usage: $0 desktop <archive.jsa>" >&2; exit 2; }
+        build_desktop "$2"
+        ;;
+    app)
+        [ -n "${2:-}" ] || { echo "Usage: $0 app <archive.jsa> [seconds] -- <java arguments...>" >&2; exit 2; }
+        archive=$2
+        shift 2
+        build_app "$archive" "$@"
+        ;;
+    *)
+        echo "Usage: $0 desktop <archive.jsa> | app <archive.jsa> [seconds] -- <java arguments...>" >&2
+        exit 2
+        ;;
+esac
@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+"""Health checks and Prometheus metrics for the desktop stack.
+
+    desktop-health check [--liveness]   exit 0 when healthy, 1 otherwise
+    desktop-health serve [--port P]     HTTP /healthz, /readyz and /metrics
+    desktop-health usage [--json]       RSS and CPU time of each program
+
+Liveness: supervisord answers on /tmp/supervisor.sock and every session's
+X display completes the X11 connection setup. Readiness additionally
+requires every supervisord program to be RUNNING and every session's VNC
+port to complete the RFB version handshake.
+
+Only the standard library and the supervisor package already in the image
+are used; each check is a few socket round trips, cheap enough for kubelet
+probes.
+"""
+
+import argparse
+import json
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+import xmlrpc.client
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STATE_DIR = os.environ.get("DESKTOP_STATE_DIR", "/tmp/desktop")
+SUPERVISOR_URL = "unix:///tmp/supervisor.sock"
+X11_SOCKET_DIR = "/tmp/.X11-unix"
+CHECK_TIMEOUT = float(os.environ.get("HEALTH_CHECK_TIMEOUT", "2"))
+CLK_TCK = os.sysconf("SC_CLK_TCK")
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+def supervisor():
+    from supervisor.xmlrpc import SupervisorTransport
+
+    transport = SupervisorTransport(None, None, SUPERVISOR_URL)
+    return xmlrpc.client.ServerProxy("http://127.0.0.1", transport=transport)
+
+
+def read_key_values(path):
+    values = {}
+    try:
+        with open(path) as handle:
+            for line in handle:
+                key, sep, value = line.strip().partition("=")
+                if sep:
+                    values[key] = value
+    except FileNotFoundError:
+        pass
+    return values
+
+
+def sessions():
+    """Connection details and timings of every configured session."""
+    count = int(os.environ.get("SESSION_COUNT", "1"))
+    result = []
+    for index in range(1, count + 1):
+        session_dir = os.path.join(STATE_DIR, "session-%d" % index)
+        env = read_key_values(os.path.join(session_dir, "session.env"))
+        result.append({
+            "index": str(index),
+            "display": env.get("DISPLAY"),
+            "port": int(env["VNC_PORT"]) if "VNC_PORT" in env else None,
+            "timings": read_key_values(os.path.join(session_dir, "timings")),
+        })
+    return result
+
+
+def x_display_responds(display):
+    """Complete the X11 connection setup on the display's unix socket."""
+    if not display:
+        return False
+    number = display.lstrip(":").split(".")[0]
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(CHECK_TIMEOUT)
+            sock.connect(os.path.join(X11_SOCKET_DIR, "X" + number))
+            # Little-endian, protocol 11.0, no authorization
+            sock.sendall(struct.pack("<cxHHHHxx", b"l", 11, 0, 0, 0))
+            return sock.recv(8)[:1] == b"\x01"
+    except OSError:
+        return False
+
+
+def rfb_handshake(port):
+    """Complete the RFB protocol version handshake on the VNC port."""
+    if not port:
+        return False
+    try:
+        with socket.create_connection(("127.0.0.1", port), timeout=CHECK_TIMEOUT) as sock:
+            if not sock.recv(12).startswith(b"RFB "):
+                return False
+            sock.sendall(b"RFB 003.008\n")
+            # Security types follow; a zero count would mean the server refused us
+            return sock.recv(1) not in (b"", b"\x00")
+    except OSError:
+        return False
+
+
+def vnc_clients(port):
+    """Established TCP connections to the VNC port."""
+    local = ":%04X" % port
+    count = 0
+    for path in ("/proc/net/tcp", "/proc/net/tcp6"):
+        try:
+            with open(path) as handle:
+                next(handle)
+                for line in handle:
+                    fields = line.split()
+                    if fields[1].endswith(local) and fields[3] == "01":
+                        count += 1
+        except FileNotFoundError:
+            continue
+    return count
+
+
+def run_checks(liveness=False):
+    """Return (healthy, [failure reasons])."""
+    failures = []
+    try:
+        processes = supervisor().supervisor.getAllProcessInfo()
+    except Exception as error:
+        return False, ["supervisord not responding: %s" % error]
+
+    for session in sessions():
+        if not x_display_responds(session["display"]):
+            failures.append("session %s: X display %s not responding"
+                            % (session["index"], session["display"]))
+        if not liveness and not rfb_handshake(session["port"]):
+            failures.append("session %s: no RFB handshake on port %s"
+                            % (session["index"], session["port"]))
+
+    if not liveness:
+        for info in processes:
+            if info["statename"] != "RUNNING":
+                failures.append("program %s is %s" % (info["name"], info["statename"]))
+    return not failures, failures
+
+
+def process_table():
+    """Map pid -> (ppid, cpu ticks, rss bytes) for every visible process."""
+    table = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open("/proc/%s/stat" % entry) as handle:
+                stat = handle.read()
+        except OSError:
+            continue
+        fields = stat[stat.rfind(")") + 2:].split()
+        table[int(entry)] = (int(fields[1]), int(fields[11]) + int(fields[12]),
+                             int(fields[21]) * PAGE_SIZE)
+    return table
+
+
+def tree_usage(table, root):
+    """CPU seconds and RSS bytes of a process and its descendants."""
+    children = {}
+    for pid, (ppid, _, _) in table.items():
+        children.setdefault(ppid, []).append(pid)
+    ticks = rss = 0
+    stack = [root]
+    while stack:
+        pid = stack.pop()
+        if pid in table:
+            ticks += table[pid][1]
+            rss += table[pid][2]
+            stack.extend(children.get(pid, []))
+    return ticks / CLK_TCK, rss
+
+
+class RestartTracker(threading.Thread):
+    """Count program restarts by watching supervisord start times."""
+
+    def __init__(self, interval):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.starts = {}
+        self.restarts = {}
+
+    def observe(self, processes):
+        with self.lock:
+            for info in processes:
+                name = info["name"]
+                previous = self.starts.get(name)
+                if previous is not None and info["start"] != previous:
+                    self.restarts[name] = self.restarts.get(name, 0) + 1
+                self.starts[name] = info["start"]
+                self.restarts.setdefault(name, 0)
+
+    def counts(self):
+        with self.lock:
+            return dict(self.restarts)
+
+    def run(self):
+        while True:
+            try:
+                self.observe(supervisor().supervisor.getAllProcessInfo())
+            except Exception:
+                pass
+            time.sleep(self.interval)
+
+
+def metric(lines, series, value, **labels):
+    """Append one sample in the Prometheus text exposition format."""
+    if labels:
+        label_text = ",".join('%s="%s"' % item for item in sorted(labels.items()))
+        lines.append("%s{%s} %s" % (series, label_text, value))
+    else:
+        lines.append("%s %s" % (series, value))
+
+
+def program_usage(server, processes, table):
+    """Map program name -> (cpu seconds, rss bytes) of its process tree.
+
+    Helpers that daemonize (dbus-daemon, pulseaudio) are reparented to
+    supervisord as PID 1 and are reported under their command name.
+    """
+    supervisord = server.supervisor.getPID()
+    owners = {info["pid"]: info["name"] for info in processes if info["pid"]}
+    owners[supervisord] = "supervisord"
+    for pid, (ppid, _, _) in table.items():
+        if ppid == supervisord and pid not in owners:
+            try:
+                with open("/proc/%d/comm" % pid) as handle:
+                    owners[pid] = handle.read().strip()
+            except OSError:
+                # Exited since the process table was read
+                continue
+
+    # Daemonized helpers of several sessions share a name and are summed
+    usage = {}
+    for pid, name in owners.items():
+        if name == "supervisord":
+            # supervisord's own tree would double count every program
+            cpu, rss = (table[pid][1] / CLK_TCK, table[pid][2]) if pid in table else (0, 0)
+        else:
+            cpu, rss = tree_usage(table, pid)
+        total_cpu, total_rss = usage.get(name, (0, 0))
+        usage[name] = (total_cpu + cpu, total_rss + rss)
+    return usage
+
+
+def render_metrics(tracker):
+    lines = []
+    started = time.monotonic()
+
+    server = supervisor()
+    processes = server.supervisor.getAllProcessInfo()
+    tracker.observe(processes)
+    table = process_table()
+
+    lines.append("# HELP supervisor_process_running Program is in the RUNNING state.")
+    lines.append("# TYPE supervisor_process_running gauge")
+    for info in processes:
+        metric(lines, "supervisor_process_running", int(info["statename"] == "RUNNING"), name=info["name"])
+
+    lines.append("# HELP supervisor_process_restarts_total Restarts observed since the exporter started.")
+    lines.append("# TYPE supervisor_process_restarts_total counter")
+    for name, count in sorted(tracker.counts().items()):
+        metric(lines, "supervisor_process_restarts_total", count, name=name)
+
+    usage = program_usage(server, processes, table)
+
+    lines.append("# HELP supervisor_process_resident_memory_bytes RSS of the program and its children.")
+    lines.append("# TYPE supervisor_process_resident_memory_bytes gauge")
+    for name, (_, rss) in sorted(usage.items()):
+        metric(lines, "supervisor_process_resident_memory_bytes", rss, name=name)
+
+    lines.append("# HELP supervisor_process_cpu_seconds_total CPU time of the program and its children.")
+    lines.append("# TYPE supervisor_process_cpu_seconds_total counter")
+    for name, (cpu, _) in sorted(usage.items()):
+        metric(lines, "supervisor_process_cpu_seconds_total", round(cpu, 2), name=name)
+
+    session_list = sessions()
+    lines.append("# HELP desktop_x_display_up X display completes the connection setup.")
+    lines.append("# TYPE desktop_x_display_up gauge")
+    for session in session_list:
+        metric(lines, "desktop_x_display_up", int(x_display_responds(session["display"])),
+               session=session["index"], display=session["display"] or "")
+
+    lines.append("# HELP desktop_vnc_clients Connected VNC clients.")
+    lines.append("# TYPE desktop_vnc_clients gauge")
+    for session in session_list:
+        if session["port"]:
+            metric(lines, "desktop_vnc_clients", vnc_clients(session["port"]),
+                   session=session["index"], port=session["port"])
+
+    lines.append("# HELP desktop_vnc_up VNC port completes the RFB version handshake.")
+    lines.append("# TYPE desktop_vnc_up gauge")
+    for session in session_list:
+        metric(lines, "desktop_vnc_up", int(rfb_handshake(session["port"])),
+               session=session["index"], port=session["port"] or "")
+
+    lines.append("# HELP desktop_startup_stage_milliseconds Time from container start to each startup stage.")
+    lines.append("# TYPE desktop_startup_stage_milliseconds gauge")
+    for session in session_list:
+        for stage, value in sorted(session["timings"].items()):
+            if stage != "container_start":
+                metric(lines, "desktop_startup_stage_milliseconds", value,
+                       session=session["index"], stage=stage)
+
+    lines.append("# HELP desktop_health_scrape_duration_seconds Time spent collecting these metrics.")
+    lines.append("# TYPE desktop_health_scrape_duration_seconds gauge")
+    metric(lines, "desktop_health_scrape_duration_seconds", round(time.monotonic() - started, 4))
+    return "\n".join(lines) + "\n"
+
+
+def make_handler(tracker):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path in ("/healthz", "/readyz"):
+                healthy, failures = run_checks(liveness=self.path == "/healthz")
+                body = "ok\n" if healthy else "\n".join(failures) + "\n"
+                self.respond(200 if healthy else 503, body, "text/plain")
+            elif self.path == "/metrics":
+                try:
+                    self.respond(200, render_metrics(tracker), "text/plain; version=0.0.4")
+                except Exception as error:
+                    self.respond(503, "metrics unavailable: %s\n" % error, "text/plain")
+            else:
+                self.respond(404, "not found\n", "text/plain")
+
+        def respond(self, status, body, content_type):
+            data = body.encode()
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            # Probes hit this every few seconds; keep the log for errors
+            pass
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    check = sub.add_parser("check", help="run the checks once and exit")
+    check.add_argument("--liveness", action="store_true",
+                       help="only check supervisord and the X displays")
+
+    usage = sub.add_parser("usage", help="print RSS and CPU time of each program")
+    usage.add_argument("--json", action="store_true", help="print a JSON object keyed by program")
+
+    serve = sub.add_parser("serve", help="serve /healthz, /readyz and /metrics over HTTP")
+    serve.add_argument("--port", type=int, default=int(os.environ.get("HEALTH_PORT", "9110")))
+    serve.add_argument("--bind", default="0.0.0.0")
+    serve.add_argument("--restart-poll", type=float, default=2.0,
+                       help="seconds between restart count polls")
+
+    args = parser.parse_args()
+
+    if args.command == "check":
+        healthy, failures = run_checks(liveness=args.liveness)
+        for failure in failures:
+            print(failure, file=sys.stderr)
+        return 0 if healthy else 1
+
+    if args.command == "usage":
+        try:
+            server = supervisor()
+            usage = program_usage(server, server.supervisor.getAllProcessInfo(), process_table())
+        except Exception as error:
+            print("supervisord not responding: %s" % error, file=sys.stderr)
+            return 1
+        if args.json:
+            json.dump({name: {"cpu_seconds": cpu, "rss_bytes": rss}
+                       for name, (cpu, rss) in sorted(usage.items())}, sys.stdout, indent=2)
+            sys.stdout.write("\n")
+        else:
+            for name, (cpu, rss) in sorted(usage.items()):
+                print("%-24s %8.1f MiB %10.2f s" % (name, rss / 1048576, cpu))
+        return 0
+
+    tracker = RestartTracker(args.restart_poll)
+    tracker.start()
+    httpd = ThreadingHTTPServer((args.bind, args.port), make_handler(tracker))
+    print("desktop-health listening on %s:%d" % (args.bind, args.port), flush=True)
+    httpd.serve_forever()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,40 @@
+# Readiness polling shared by vnc-startup.sh and build-cds-archive.sh
+# Sourced, not executed; the sourcing script defines log()
+
+# Overall timeout per stage (seconds) and the bounds of the exponential
+# backoff used between readiness polls (milliseconds)
+READY_TIMEOUT=${READY_TIMEOUT:-30}
+READY_POLL_MIN_MS=${READY_POLL_MIN_MS:-25}
+READY_POLL_MAX_MS=${READY_POLL_MAX_MS:-1000}
+
+# Current time in milliseconds since the epoch
+now_ms() {
+    date +%s%3N
+}
+
+# Poll a readiness check with bounded exponential backoff
+# Usage: wait_until <stage> <pid|-> <command...>
+# Fails immediately if <pid> exits, or after READY_TIMEOUT seconds
+wait_until() {
+    local stage=$1 pid=$2
+    shift 2
+    local start elapsed delay=$READY_POLL_MIN_MS
+    start=$(now_ms)
+
+    until "$@" >/dev/null 2>&1; do
+        elapsed=$(( $(now_ms) - start ))
+        if [ "$pid" != "-" ] && ! kill -0 "$pid" 2>/dev/null; then
+            log "ERROR: $stage process exited after ${elapsed} ms"
+            return 1
+        fi
+        if [ "$elapsed" -ge $(( READY_TIMEOUT * 1000 )) ]; then
+            log "ERROR: $stage not ready after ${READY_TIMEOUT}s"
+            return 1
+        fi
+        sleep "$(printf '%d.%03d' $(( delay / 1000 )) $(( delay % 1000 )))"
+        delay=$(( delay * 2 ))
+        [ "$delay" -le "$READY_POLL_MAX_MS" ] || delay=$READY_POLL_MAX_MS
+    done
+
+    log "$stage ready in $(( $(now_ms) - start )) ms"
+}
@@ -9,6 +9,9 @@ log() {
     echo "[$(date '+%Y-%m-%d %H:%M:%S')] ENTRYPOINT: $1"
 }
 
+# Reference point for the startup timings recorded by vnc-startup.sh
+export CONTAINER_START_MS=${CONTAINER_START_MS:-$(date +%s%3N)}
+
 log "Starting XFCE base container with EPEL repositories..."
 
 # Verify EPEL repository is available
@@ -29,10 +32,84 @@ export LOGNAME=${LOGNAME:-root}
 export XDG_RUNTIME_DIR=${XDG_RUNTIME_DIR:-/tmp/runtime-root}
 export XDG_SESSION_TYPE=${XDG_SESSION_TYPE:-x11}
 
-# Ensure proper font cache
-if command -v fc-cache >/dev/null 2>&1; then
-    log "Updating font cache..."
-    fc-cache -f -v >/dev/null 2>&1 || true
+# The runtime user cannot write $HOME (/root); keep per-user caches, such as
+# the fontconfig cache written by fc-cache below, somewhere writable
+if ! mkdir -p "${XDG_CACHE_HOME:-$HOME/.cache}" 2>/dev/null || [ ! -w "${XDG_CACHE_HOME:-$HOME/.cache}" ]; then
+    export XDG_CACHE_HOME=/tmp/.cache
+    mkdir -p "$XDG_CACHE_HOME"
+fi
+
+# /tmp may be an emptyDir that survives container restarts; drop the
+# readiness files of X servers that were killed with the old container
+rm -f "${DESKTOP_STATE_DIR:-/tmp/desktop}"/session-*/xvfb.displayfd
+
+# Number of independent desktop sessions supervisord runs in this container
+export SESSION_COUNT=${SESSION_COUNT:-1}
+if ! [ "$SESSION_COUNT" -ge 1 ] 2>/dev/null; then
+    log "ERROR: SESSION_COUNT must be a positive integer, got '$SESSION_COUNT'"
+    exit 1
+fi
+log "Configured for $SESSION_COUNT desktop session(s)"
+
+# Port of the health and metrics endpoint run by supervisord
+export HEALTH_PORT=${HEALTH_PORT:-9110}
+
+# Size cap and rotated copies kept for each supervisord log in /tmp, which
+# is often a memory-backed emptyDir
+export LOG_MAX_BYTES=${LOG_MAX_BYTES:-5MB}
+export LOG_BACKUPS=${LOG_BACKUPS:-2}
+
+# Font cache handling: the system cache is generated at image build time
+# FONT_CACHE_UPDATE=auto  - incremental update only if font directories changed
+#                           after the build (e.g. fonts added by a derived image)
+# FONT_CACHE_UPDATE=force - rebuild the cache from scratch
+# FONT_CACHE_UPDATE=skip  - do nothing
+FONT_CACHE_UPDATE=${FONT_CACHE_UPDATE:-auto}
+FONT_CACHE_STAMP=/usr/lib/fontconfig/cache/.image-build-stamp
+
+# Print the first font directory modified after the build-time cache stamp
+stale_font_dir() {
+    local dirs=() dir
+    for dir in /usr/share/fonts /usr/local/share/fonts "$HOME/.fonts" "$HOME/.local/share/fonts"; do
+        [ -d "$dir" ] && dirs+=("$dir")
+    done
+    [ ${#dirs[@]} -gt 0 ] || return 0
+    if [ ! -f "$FONT_CACHE_STAMP" ]; then
+        echo "${dirs[0]}"
+        return 0
+    fi
+    find "${dirs[@]}" -type d -newer "$FONT_CACHE_STAMP" -print -quit 2>/dev/null
+}
+
+# Run fc-cache and move the stamp forward so the next start skips the update.
+# As a non-root user only the per-user cache can be written, which does not
+# outlive the container, so say how to fix it at build time instead.
+update_font_cache() {
+    if ! fc-cache "$@" >/dev/null 2>&1; then
+        log "WARNING: fc-cache $* failed, applications will scan fonts at startup"
+        return 1
+    fi
+    if [ -w "$(dirname "$FONT_CACHE_STAMP")" ]; then
+        touch "$FONT_CACHE_STAMP"
+    else
+        log "WARNING: font cache updated in ${XDG_CACHE_HOME:-$HOME/.cache}/fontconfig only and is redone on every start; run 'fc-cache -s && touch $FONT_CACHE_STAMP' as root in the image build that adds fonts"
+    fi
+}
+
+if [ "$FONT_CACHE_UPDATE" != "skip" ] && command -v fc-cache >/dev/null 2>&1; then
+    FONT_CACHE_START=$(date +%s%3N)
+    if [ "$FONT_CACHE_UPDATE" = "force" ]; then
+        log "Rebuilding font cache (FONT_CACHE_UPDATE=force)..."
+        update_font_cache -f && FONT_CACHE_ACTION="rebuilt" || FONT_CACHE_ACTION="not rebuilt"
+    elif STALE_DIR=$(stale_font_dir) && [ -n "$STALE_DIR" ]; then
+        log "Fonts changed since image build ($STALE_DIR), updating font cache..."
+        update_font_cache && FONT_CACHE_ACTION="updated" || FONT_CACHE_ACTION="not updated"
+    else
+        FONT_CACHE_ACTION="up to date"
+    fi
+    log "Font cache $FONT_CACHE_ACTION in $(( $(date +%s%3N) - FONT_CACHE_START )) ms"
+else
+    log "Skipping font cache check"
 fi
 
 log "Environment setup complete"
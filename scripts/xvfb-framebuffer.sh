@@ -0,0 +1,80 @@
+#!/bin/bash
+# Xvfb shared-memory framebuffer helper
+# Locates and describes the memory-mapped framebuffer Xvfb writes with
+# -fbdir (XVFB_FRAMEBUFFER=shm), so x11vnc, screenshot and recording tools
+# can read pixels directly instead of copying them through X requests.
+#
+# Usage: xvfb-framebuffer.sh dir|file|rawfb|info|snapshot <output.xwd>
+
+set -e
+
+DISPLAY=${DISPLAY:-:1}
+XVFB_FBDIR=${XVFB_FBDIR:-/dev/shm/xvfb}
+
+DISPLAY_NUM=${DISPLAY#:}
+DISPLAY_NUM=${DISPLAY_NUM%%.*}
+FB_DIR=$XVFB_FBDIR/display-$DISPLAY_NUM
+FB_FILE=$FB_DIR/Xvfb_screen0
+
+# Read a big-endian CARD32 from the XWD header at the given byte offset
+xwd_field() {
+    echo $(( 16#$(od -An -tx1 -j "$1" -N4 "$FB_FILE" | tr -d ' \n') ))
+}
+
+# Parse the XWD header Xvfb keeps at the start of the framebuffer file
+read_header() {
+    if [ ! -s "$FB_FILE" ]; then
+        echo "No shared-memory framebuffer for display $DISPLAY at $FB_FILE" >&2
+        exit 1
+    fi
+    FB_WIDTH=$(xwd_field 16)
+    FB_HEIGHT=$(xwd_field 20)
+    FB_BPP=$(xwd_field 44)
+    FB_STRIDE=$(xwd_field 48)
+    FB_RED_MASK=$(xwd_field 56)
+    FB_GREEN_MASK=$(xwd_field 60)
+    FB_BLUE_MASK=$(xwd_field 64)
+    # Pixels follow the header (including window name) and the colormap
+    FB_OFFSET=$(( $(xwd_field 0) + $(xwd_field 76) * 12 ))
+}
+
+case "${1:-}" in
+    dir)
+        echo "$FB_DIR"
+        ;;
+    file)
+        echo "$FB_FILE"
+        ;;
+    rawfb)
+        # x11vnc -rawfb specification for polling the framebuffer in place.
+        # The leading "+" keeps the X display open, so keyboard and mouse
+        # input (XTEST) and -xdamage still go through $DISPLAY
+        read_header
+        printf '+map:%s@%dx%dx%d:%x/%x/%x+%d\n' "$FB_FILE" "$FB_WIDTH" "$FB_HEIGHT" "$FB_BPP" \
+            "$FB_RED_MASK" "$FB_GREEN_MASK" "$FB_BLUE_MASK" "$FB_OFFSET"
+        ;;
+    info)
+        # Raw geometry for recording tools that read the pixels directly
+        read_header
+        echo "file=$FB_FILE"
+        echo "offset=$FB_OFFSET"
+        echo "width=$FB_WIDTH"
+        echo "height=$FB_HEIGHT"
+        echo "bits_per_pixel=$FB_BPP"
+        echo "bytes_per_line=$FB_STRIDE"
+        printf 'masks=%x/%x/%x\n' "$FB_RED_MASK" "$FB_GREEN_MASK" "$FB_BLUE_MASK"
+        ;;
+    snapshot)
+        # The framebuffer file is a valid XWD image (xwud, ImageMagick, ffmpeg)
+        if [ -z "${2:-}" ]; then
+            echo "Usage: $0 snapshot <output.xwd>" >&2
+            exit 2
+        fi
+        read_header
+        cp "$FB_FILE" "$2"
+        ;;
+    *)
+        echo "Usage: $0 dir|file|rawfb|info|snapshot <output.xwd>" >&2
+        exit 2
+        ;;
+esac